@@ -8,27 +8,40 @@ Users can upload a file with keywords and export results
 
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+import io
 import os
+import re
 import sys
 import json
 import time
-import tempfile
 import subprocess
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import batch_search
+from export_to_excel import export_to_excel as export_results
+from common_logging import setup_logging
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler("streamlit_app.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Set up logging (only configured on the first run of the script in this process)
+setup_logging("streamlit_app.log")
 
 logger = logging.getLogger(__name__)
 
+# Number of products shown in a results table until "Show all" is toggled
+PREVIEW_ROWS = 200
+
+# Maximum number of result files read at the same time
+MAX_LOAD_WORKERS = 16
+
+# Product page URLs accepted by the URL scraper
+PRODUCT_URL_RE = re.compile(r"^https?://(?:www\.)?directdermasupplies\.com/products/[^?#\s]+$")
+
 # Page config
 st.set_page_config(
     page_title="Direct Derma Scraper",
@@ -37,25 +50,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-def read_keywords_from_file(uploaded_file, is_excel=False, column_name=None):
-    """Extract keywords from an uploaded file"""
+@st.cache_data(show_spinner=False)
+def read_keywords_from_file(file_bytes, is_excel=False, column_name=None):
+    """Extract keywords from the contents of an uploaded file (cached per file contents)"""
     try:
         if is_excel:
-            # Read Excel file
-            df = pd.read_excel(uploaded_file)
-            
-            # Use specified column or default to first column
-            if column_name and column_name in df.columns:
-                keywords = df[column_name].astype(str).tolist()
-            else:
-                keywords = df.iloc[:, 0].astype(str).tolist()
-                
-            # Remove empty keywords and strip whitespace
-            keywords = [k.strip() for k in keywords if k and str(k).strip() and str(k).lower() != 'nan']
+            # Read the specified column (or the first column) of the Excel file
+            keywords = batch_search.read_keywords_from_excel(io.BytesIO(file_bytes), column_name)
         else:
-            # Read text file
-            content = uploaded_file.getvalue().decode('utf-8')
-            keywords = [line.strip() for line in content.split('\n') if line.strip()]
+            # Read text file line by line instead of decoding and splitting a full copy
+            lines = io.TextIOWrapper(io.BytesIO(file_bytes), encoding='utf-8')
+            keywords = [line.strip() for line in lines if line.strip()]
         
         return keywords
     except Exception as e:
@@ -63,54 +68,51 @@ def read_keywords_from_file(uploaded_file, is_excel=False, column_name=None):
         logger.error(f"Error reading file: {str(e)}")
         return []
 
-def run_batch_search(keywords, output_dir):
-    """Run batch search for keywords and save results to output_dir"""
-    # Create a temporary file with keywords
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp:
-        for keyword in keywords:
-            temp.write(f"{keyword}\n")
-        temp_file = temp.name
-    
-    try:
-        # Run the batch search script
-        cmd = [sys.executable, "batch_search.py", "--input", temp_file, "--output-dir", output_dir]
-        process = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        
-        if process.returncode == 0:
-            st.success("Batch search completed successfully!")
-            return True
-        else:
-            st.error(f"Batch search failed with return code {process.returncode}")
-            st.code(process.stderr)
-            return False
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error running batch search: {str(e)}")
-        st.code(e.stderr)
-        return False
-    finally:
-        # Clean up the temporary file
-        try:
-            os.remove(temp_file)
-        except:
-            pass
+def read_uploaded_file(uploaded_file, is_excel=False, column_name=None):
+    """Extract one entry per line/row from an uploaded file, copying its buffer only once"""
+    st.write(f"File uploaded: {uploaded_file.name}")
+    return read_keywords_from_file(uploaded_file.getvalue(), is_excel, column_name)
 
-def export_to_excel(input_dir, output_file):
-    """Export search results to Excel file"""
-    try:
-        cmd = [sys.executable, "export_to_excel.py", "--input-dir", input_dir, "--output", output_file]
-        process = subprocess.run(cmd, check=True, capture_output=True, text=True)
+def run_batch_search(keywords, output_dir, excel_file=None):
+    """Run batch search for keywords and save results to output_dir (and optionally excel_file)"""
+    with st.status("Running search...", expanded=True) as status:
+        progress = st.progress(0.0)
+        
+        def update_progress(done, total, keyword):
+            progress.progress(done / total, text=f"Finished {done}/{total}: {keyword}")
+        
+        success = batch_search.run(keywords, output_dir, progress_cb=update_progress, excel_file=excel_file)
         
-        if process.returncode == 0:
-            st.success("Results exported to Excel successfully!")
-            return True
+        if success:
+            status.update(label="Batch search completed successfully!", state="complete", expanded=False)
         else:
-            st.error(f"Export failed with return code {process.returncode}")
-            st.code(process.stderr)
-            return False
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error exporting to Excel: {str(e)}")
-        st.code(e.stderr)
-        return False
+            status.update(label="Batch search failed", state="error")
+        return success
+
+def results_signature(output_dir):
+    """Return the (name, mtime, size) of every result file, identifying the state of output_dir"""
+    with os.scandir(output_dir) as entries:
+        return tuple(sorted(
+            (e.name, e.stat().st_mtime_ns, e.stat().st_size)
+            for e in entries if e.name.endswith('_results.json')
+        ))
+
+@st.cache_data(show_spinner=False)
+def export_to_excel(input_dir, signature):
+    """
+    Export search results to an in-memory Excel file
+    
+    The workbook is cached per results_signature(), so exporting an unchanged
+    directory again returns the previous workbook without rebuilding it. A failed
+    export raises instead, so it is not cached and can be retried.
+    
+    Returns:
+        bytes: The Excel file contents
+    """
+    buffer = io.BytesIO()
+    if not export_results(input_dir, buffer):
+        raise RuntimeError("Export failed. Check the logs for details.")
+    return buffer.getvalue()
 
 def display_search_summary(output_dir):
     """Display search summary from the output directory"""
@@ -121,29 +123,82 @@ def display_search_summary(output_dir):
     else:
         st.warning("Summary file not found")
 
+def read_results_table(file_path):
+    """Parse a JSON results file into an Arrow table"""
+    with open(file_path, 'rb') as f:
+        data = orjson.loads(f.read()) if orjson is not None else json.load(f)
+    return pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False)
+
+@st.cache_data(show_spinner=False)
+def load_results_table(file_path, mtime_ns):
+    """
+    Load a JSON results file into an Arrow table
+    
+    The table is cached per file path and modification time, so reruns only pay
+    for slicing the rows that are displayed.
+    """
+    return read_results_table(file_path)
+
+@st.cache_data(show_spinner=False)
+def load_results_tables(files):
+    """
+    Load several JSON results files concurrently
+    
+    Args:
+        files (tuple): (path, mtime_ns) pairs, which also serve as the cache key
+        
+    Returns:
+        dict: Maps each path to its Arrow table, or to an error message if it could not be loaded
+    """
+    def load(file_path):
+        try:
+            return read_results_table(file_path)
+        except Exception as e:
+            return str(e)
+    
+    paths = [path for path, _ in files]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_LOAD_WORKERS, len(paths)))) as executor:
+        return dict(zip(paths, executor.map(load, paths)))
+
+def show_results_table(table, key):
+    """Display the first rows of a results table, with a toggle to display all of them"""
+    if table.num_rows > PREVIEW_ROWS and not st.toggle(f"Show all {table.num_rows} products", key=key):
+        table = table.slice(0, PREVIEW_ROWS)
+    st.dataframe(table.to_pandas(types_mapper=pd.ArrowDtype), use_container_width=True)
+
 def display_search_results(output_dir):
     """Display search results from JSON files in the output directory"""
     # Find all JSON files in the output directory
-    json_files = [f for f in os.listdir(output_dir) if f.endswith('_results.json')]
+    with os.scandir(output_dir) as entries:
+        json_files = [e for e in entries if e.name.endswith('_results.json') and e.is_file()]
+    json_files.sort(key=lambda e: e.name)
     
     if not json_files:
         st.warning("No result files found")
         return
     
+    # Read all non-empty files up front, in parallel
+    tables = load_results_tables(tuple(
+        (e.path, e.stat().st_mtime_ns) for e in json_files if e.stat().st_size
+    ))
+    
     # Display tabs for each keyword
-    tabs = st.tabs([f.replace('_results.json', '') for f in json_files])
+    tabs = st.tabs([e.name[:-len('_results.json')] for e in json_files])
     
     for i, (tab, json_file) in enumerate(zip(tabs, json_files)):
         with tab:
             try:
-                with open(os.path.join(output_dir, json_file), 'r') as f:
-                    data = json.load(f)
+                # Skip files that were created but never written to
+                if json_file.path not in tables:
+                    st.info("No products found for this keyword")
+                    continue
                 
-                if data:
-                    # Convert to DataFrame for display
-                    df = pd.DataFrame(data)
-                    st.dataframe(df, use_container_width=True)
-                    st.write(f"Total products: {len(data)}")
+                table = tables[json_file.path]
+                if isinstance(table, str):
+                    st.error(f"Error loading results: {table}")
+                elif table.num_rows:
+                    show_results_table(table, key=f"show_all_{json_file.name}")
+                    st.write(f"Total products: {table.num_rows}")
                 else:
                     st.info("No products found for this keyword")
             except Exception as e:
@@ -182,11 +237,8 @@ def main():
             )
             
             if uploaded_file is not None:
-                st.write(f"File uploaded: {uploaded_file.name}")
-                
                 # Extract keywords from the file
-                is_excel = file_type == "Excel file (.xlsx)"
-                keywords = read_keywords_from_file(uploaded_file, is_excel, column_name)
+                keywords = read_uploaded_file(uploaded_file, file_type == "Excel file (.xlsx)", column_name)
         else:
             # Manual keyword entry
             keyword_text = st.text_area(
@@ -208,34 +260,40 @@ def main():
             
             # Run search
             if st.button("Run Keyword Search"):
+                # Timestamp this run once; the Excel file name is derived from it, and it is
+                # only kept if the search succeeds
+                run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+                st.session_state.run_ts = None
+                
                 # Create output directory if it doesn't exist
                 os.makedirs(output_dir, exist_ok=True)
                 
-                # Show progress
-                with st.spinner("Running search..."):
-                    start_time = time.time()
-                    success = run_batch_search(keywords, output_dir)
-                    end_time = time.time()
-                    
-                    if success:
-                        st.success(f"Search completed in {end_time - start_time:.2f} seconds!")
-                        
-                        # Create Excel file
-                        excel_file = f"keyword_search_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                        with st.spinner("Exporting results to Excel..."):
-                            export_success = export_to_excel(output_dir, excel_file)
-                            
-                            if export_success and os.path.exists(excel_file):
-                                # Provide download link
-                                with open(excel_file, "rb") as file:
-                                    st.download_button(
-                                        label="Download Excel Results",
-                                        data=file,
-                                        file_name=excel_file,
-                                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                    )
-                    else:
-                        st.error("Search failed. Check the logs for details.")
+                # The Excel file is written by the batch search as each keyword finishes
+                excel_file = f"keyword_search_{run_ts}.xlsx"
+                
+                # Run the search, reporting progress as each keyword finishes
+                start_time = time.time()
+                success = run_batch_search(keywords, output_dir, excel_file)
+                end_time = time.time()
+                
+                if success:
+                    st.success(f"Search completed in {end_time - start_time:.2f} seconds!")
+                    st.session_state.run_ts = run_ts
+                else:
+                    st.error("Search failed. Check the logs for details.")
+            
+            # The download stays available on later reruns, until the next search
+            if st.session_state.get('run_ts'):
+                excel_file = f"keyword_search_{st.session_state.run_ts}.xlsx"
+                if os.path.exists(excel_file):
+                    # Provide download link
+                    with open(excel_file, "rb") as file:
+                        st.download_button(
+                            label="Download Excel Results",
+                            data=file,
+                            file_name=excel_file,
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
         else:
             if keyword_input_method == "Upload file":
                 st.warning("Please upload a file with keywords.")
@@ -281,28 +339,18 @@ def main():
             )
             
             if url_file is not None:
-                try:
-                    st.write(f"File uploaded: {url_file.name}")
-                    
-                    if file_type == "Excel file (.xlsx)":
-                        # Excel file processing
-                        urls_to_scrape = read_keywords_from_file(url_file, is_excel=True, column_name=column_name)
-                    else:
-                        # Text file processing
-                        content = url_file.getvalue().decode('utf-8')
-                        urls_to_scrape = [url.strip() for url in content.split('\n') if url.strip()]
-                        
-                except Exception as e:
-                    st.error(f"Error reading URL file: {str(e)}")
+                # Extract URLs from the file
+                urls_to_scrape = read_uploaded_file(url_file, file_type == "Excel file (.xlsx)", column_name)
         
         # URL validation 
         valid_urls = []
         if urls_to_scrape:
-            # Basic validation - ensure URLs contain the domain and product path
-            valid_urls = [url for url in urls_to_scrape if "directdermasupplies.com/products/" in url]
+            # Ensure URLs are http(s) product pages on the Direct Derma domain
+            valid_urls = list(filter(PRODUCT_URL_RE.match, urls_to_scrape))
             
             if len(valid_urls) != len(urls_to_scrape):
-                st.warning(f"{len(urls_to_scrape) - len(valid_urls)} URLs were invalid and will be skipped.")
+                invalid_urls = set(urls_to_scrape) - set(valid_urls)
+                st.warning(f"{len(invalid_urls)} URLs were invalid and will be skipped.")
             
             st.write(f"Found {len(valid_urls)} valid URLs to scrape:")
             st.write("\n".join(valid_urls[:5]) + ("..." if len(valid_urls) > 5 else ""))
@@ -312,59 +360,55 @@ def main():
         
         # Run scraper
         if valid_urls and st.button("Run URL Scraper"):
+            # Timestamp this run once; the export file name is derived from it, and it is
+            # only kept if the scrape succeeds
+            run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+            st.session_state.url_run_ts = None
+            
             with st.spinner("Scraping URLs..."):
-                # Create a temporary file with the URLs
-                with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp:
-                    for url in valid_urls:
-                        temp.write(f"{url}\n")
-                    temp_file = temp.name
-                
                 try:
-                    # Run the scraper
-                    cmd = [sys.executable, "run_scraper.py", "--input", temp_file, "--output", url_output_file]
-                    process = subprocess.run(cmd, check=True, capture_output=True, text=True)
+                    # Run the scraper, passing the URLs on its standard input
+                    cmd = [sys.executable, "run_scraper.py", "--input", "-", "--output", url_output_file]
+                    process = subprocess.run(cmd, input="\n".join(valid_urls) + "\n",
+                                             check=True, capture_output=True, text=True)
                     
                     if process.returncode == 0:
                         st.success(f"URL scraping completed successfully!")
-                        
-                        # Read and display results
-                        if os.path.exists(url_output_file):
-                            try:
-                                with open(url_output_file, 'r') as f:
-                                    data = json.load(f)
-                                
-                                st.write(f"Scraped {len(data)} products:")
-                                df = pd.DataFrame(data)
-                                st.dataframe(df, use_container_width=True)
-                                
-                                # Export to Excel option
-                                excel_file = f"url_scrape_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                                if st.button("Export to Excel"):
-                                    # Convert to Excel
-                                    df.to_excel(excel_file, index=False)
-                                    
-                                    # Provide download link
-                                    with open(excel_file, "rb") as file:
-                                        st.download_button(
-                                            label="Download Excel Results",
-                                            data=file,
-                                            file_name=excel_file,
-                                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                        )
-                            except Exception as e:
-                                st.error(f"Error processing results: {str(e)}")
+                        st.session_state.url_run_ts = run_ts
+                        st.session_state.url_run_output = url_output_file
                     else:
                         st.error(f"URL scraping failed with return code {process.returncode}")
                         st.code(process.stderr)
                 except subprocess.CalledProcessError as e:
                     st.error(f"Error running URL scraper: {str(e)}")
                     st.code(e.stderr)
-                finally:
-                    # Clean up
-                    try:
-                        os.remove(temp_file)
-                    except:
-                        pass
+        
+        # The results of the last run stay shown on later reruns, so its export button works
+        if st.session_state.get('url_run_ts') and os.path.exists(st.session_state.url_run_output):
+            try:
+                with open(st.session_state.url_run_output, 'r') as f:
+                    data = json.load(f)
+                
+                st.write(f"Scraped {len(data)} products:")
+                df = pd.DataFrame(data)
+                st.dataframe(df, use_container_width=True)
+                
+                # Export to Excel option
+                excel_file = f"url_scrape_{st.session_state.url_run_ts}.xlsx"
+                if st.button("Export to Excel"):
+                    # Convert to Excel
+                    df.to_excel(excel_file, index=False)
+                    
+                    # Provide download link
+                    with open(excel_file, "rb") as file:
+                        st.download_button(
+                            label="Download Excel Results",
+                            data=file,
+                            file_name=excel_file,
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+            except Exception as e:
+                st.error(f"Error processing results: {str(e)}")
     
     with tab3:
         # Results section
@@ -373,8 +417,12 @@ def main():
         # Input for results directory
         results_dir = st.text_input("Results directory:", "keyword_results", key="results_dir")
         
-        # Refresh button
+        # Refresh button; the results stay shown on later reruns (such as toggling "Show all")
+        # until another directory is entered
         if st.button("Refresh Results"):
+            st.session_state.shown_results_dir = results_dir
+        
+        if st.session_state.get('shown_results_dir') == results_dir:
             if os.path.exists(results_dir):
                 # Show search summary
                 st.subheader("Search Summary")
@@ -388,17 +436,22 @@ def main():
                 if st.button("Export to New Excel File"):
                     excel_file = f"search_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
                     with st.spinner("Exporting results to Excel..."):
-                        export_success = export_to_excel(results_dir, excel_file)
+                        try:
+                            excel_data = export_to_excel(results_dir, results_signature(results_dir))
+                        except Exception as e:
+                            excel_data = None
+                            st.error(f"Error exporting to Excel: {str(e)}")
+                            logger.error(f"Error exporting to Excel: {str(e)}")
                         
-                        if export_success and os.path.exists(excel_file):
+                        if excel_data:
+                            st.success("Results exported to Excel successfully!")
                             # Provide download link
-                            with open(excel_file, "rb") as file:
-                                st.download_button(
-                                    label="Download Excel Results",
-                                    data=file,
-                                    file_name=excel_file,
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                                )
+                            st.download_button(
+                                label="Download Excel Results",
+                                data=excel_data,
+                                file_name=excel_file,
+                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            )
             else:
                 st.warning(f"Directory {results_dir} does not exist")
         
@@ -408,19 +461,21 @@ def main():
         url_result_file = st.text_input("URL result file:", "url_scrape_results.json", key="url_result_file")
         
         if os.path.exists(url_result_file) and st.button("Load URL Results"):
+            st.session_state.shown_url_result_file = url_result_file
+        
+        if st.session_state.get('shown_url_result_file') == url_result_file and os.path.exists(url_result_file):
             try:
-                with open(url_result_file, 'r') as f:
-                    data = json.load(f)
+                table = load_results_table(url_result_file, os.stat(url_result_file).st_mtime_ns)
                 
-                st.write(f"Loaded {len(data)} products from URL scrape:")
-                df = pd.DataFrame(data)
-                st.dataframe(df, use_container_width=True)
+                st.write(f"Loaded {table.num_rows} products from URL scrape:")
+                show_results_table(table, key="show_all_url_results")
                 
                 # Export to Excel option
-                excel_file = f"url_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
                 if st.button("Export URL Results to Excel"):
+                    excel_file = f"url_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                    
                     # Convert to Excel
-                    df.to_excel(excel_file, index=False)
+                    table.to_pandas().to_excel(excel_file, index=False)
                     
                     # Provide download link
                     with open(excel_file, "rb") as file:
@@ -2,12 +2,13 @@
 """
 Batch Product Search Tool
 
-This script reads keywords from a file (text or Excel) and runs the search_products.py script
-for each keyword, saving the results to separate JSON files.
+This script reads keywords from a file (text or Excel) and runs the search_products search
+for each keyword concurrently, then scrapes the products of every keyword with a single
+scraper process, saving the results to separate JSON files.
 
 Usage:
-    python batch_search.py --input KEYWORDS_FILE [--output-dir OUTPUT_DIRECTORY]
-    python batch_search.py --excel EXCEL_FILE [--column COLUMN_NAME] [--output-dir OUTPUT_DIRECTORY]
+    python batch_search.py --input KEYWORDS_FILE [--output-dir OUTPUT_DIRECTORY] [--excel-output EXCEL_FILE]
+    python batch_search.py --excel EXCEL_FILE [--column COLUMN_NAME] [--output-dir OUTPUT_DIRECTORY] [--excel-output EXCEL_FILE]
 e.g. python batch_search.py --input keywords_to_scrape.txt --output-dir my_results
      python batch_search.py --excel keywords.xlsx --column Keywords --output-dir my_results
     """
@@ -16,53 +17,322 @@ import argparse
 import os
 import sys
 import logging
-import subprocess
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from common_logging import setup_logging
 
-def setup_logging():
-    """Set up logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("batch_search.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pandas as pd
+    _HAS_PANDAS = True
+except ImportError:
+    pd = None
+    _HAS_PANDAS = False
+
+import search_products
+
+# Maximum number of keywords searched at the same time
+MAX_WORKERS = 16
+
+# Columns of the Excel workbook written alongside the JSON results
+EXCEL_COLUMNS = ['keyword', 'product_name', 'price', 'currency', 'product_url', 'timestamp']
 
 def read_keywords_from_txt(file_path):
     """Read keywords from a text file"""
     with open(file_path, 'r') as f:
         return [line.strip() for line in f if line.strip()]
 
-def read_keywords_from_excel(file_path, column_name=None):
-    """Read keywords from an Excel file"""
+def _read_excel(source, usecols):
+    """Read the selected Excel columns as strings, preferring the faster calamine engine"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
     try:
-        import pandas as pd
+        return pd.read_excel(source, engine='calamine', usecols=usecols, dtype=str)
     except ImportError:
+        # python-calamine is not installed, fall back to openpyxl
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        return pd.read_excel(source, engine='openpyxl', usecols=usecols, dtype=str)
+
+def read_keywords_from_excel(file_path, column_name=None):
+    """Read keywords from an Excel file (a path or a binary file-like object)"""
+    if not _HAS_PANDAS:
         raise ImportError("pandas is required for Excel support. Install with: pip install pandas openpyxl")
     
     try:
-        # Read the Excel file
-        df = pd.read_excel(file_path)
+        # If column name is specified, only read that column
+        df = None
+        if column_name:
+            df = _read_excel(file_path, lambda col: str(col) == column_name)
         
-        # If column name is specified, use it, otherwise use the first column
-        if column_name and column_name in df.columns:
-            keywords = df[column_name].astype(str).tolist()
-        else:
-            # Use the first column
-            keywords = df.iloc[:, 0].astype(str).tolist()
+        # Otherwise (or if the column doesn't exist) use the first column
+        if df is None or len(df.columns) == 0:
+            df = _read_excel(file_path, [0])
         
         # Remove empty keywords and strip whitespace
-        keywords = [k.strip() for k in keywords if k and str(k).strip() and str(k).lower() != 'nan']
+        keywords = df.iloc[:, 0].astype('string').str.strip()
+        keywords = keywords[keywords.notna() & (keywords != '') & (keywords.str.lower() != 'nan')]
         
-        return keywords
+        return keywords.tolist()
     except Exception as e:
         raise ValueError(f"Error reading Excel file: {str(e)}")
 
+def iter_results(file_path):
+    """
+    Yield the products of a JSON results file one at a time
+    
+    Uses ijson when available so the array is streamed instead of loaded into memory.
+    
+    Args:
+        file_path (str): Path to the JSON results file
+    """
+    with open(file_path, 'rb') as f:
+        if ijson is not None:
+            yield from ijson.items(f, 'item', use_float=True)
+        else:
+            yield from json.load(f)
+
+def count_results(file_path):
+    """Count the products in a JSON results file"""
+    return sum(1 for _ in iter_results(file_path))
+
+def append_excel_rows(sheet, keyword, products):
+    """Append one row per product to a write-only worksheet, returning the number of rows"""
+    count = 0
+    for product in products:
+        sheet.append([keyword] + [product.get(col) for col in EXCEL_COLUMNS[1:]])
+        count += 1
+    return count
+
+def _search_keyword(keyword, output_file):
+    """
+    Search for the product URLs of one keyword, to be scraped into output_file
+    
+    Runs in a worker thread and never raises; failures are reported in the returned record.
+    
+    Returns:
+        dict: keyword, output_file, urls (list of product URLs), results (list of products,
+            filled in once scraped, or None on error), result_count, status ('OK' or 'ERROR')
+            and error message
+    """
+    record = {
+        'keyword': keyword,
+        'output_file': output_file,
+        'urls': [],
+        'results': None,
+        'result_count': 0,
+        'status': 'OK',
+        'error': None,
+    }
+    try:
+        record['urls'] = search_products.search_products(keyword)
+        if not record['urls']:
+            logging.getLogger(__name__).info("No products found matching the keyword: '%s'", keyword)
+    except Exception as e:
+        logging.getLogger(__name__).error("Error processing keyword '%s': %s", keyword, e)
+        record.update(status='ERROR', error=str(e))
+    return record
+
+def _scrape_records(records, on_finished=None):
+    """
+    Scrape the product URLs of every searched keyword with a single scraper process
+    
+    Fills in the results of each record as its crawl ends and calls on_finished(record);
+    if the scraper fails, the records it had not finished are marked as errors.
+    """
+    # Keywords that map to the same output file (such as "a b" and "a_b") share one crawl
+    pending = {}
+    for record in records:
+        if record['status'] == 'OK' and record['urls']:
+            pending.setdefault(record['output_file'], []).append(record)
+    
+    def crawl_finished(output_file, results):
+        for record in pending.pop(output_file, []):
+            record.update(results=results, result_count=len(results))
+            if on_finished:
+                on_finished(record)
+    
+    try:
+        search_products.scrape_batch({
+            output_file: list(dict.fromkeys(url for record in group for url in record['urls']))
+            for output_file, group in pending.items()
+        }, on_finished=crawl_finished)
+    except Exception as e:
+        logging.getLogger(__name__).error("Error scraping product prices: %s", e)
+        for group in list(pending.values()):
+            for record in group:
+                record.update(status='ERROR', error=str(e))
+                if on_finished:
+                    on_finished(record)
+    
+    # Keywords without products were finished by their search
+    for record in records:
+        if record['status'] == 'OK' and record['results'] is None:
+            record['results'] = []
+
+def _remove_stale_output(output_file):
+    """Delete the results (and Parquet copy) an earlier run left for a keyword"""
+    for path in (output_file, os.path.splitext(output_file)[0] + '.parquet'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def format_summary_entry(record):
+    """Format the summary file entry for a keyword record returned by _search_keyword"""
+    if record['status'] == 'ERROR':
+        return (f"Keyword: {record['keyword']}\n"
+                "Status: ERROR\n"
+                f"Error message: {record['error']}\n"
+                + "-" * 50 + "\n\n")
+    return (f"Keyword: {record['keyword']}\n"
+            f"Products found: {record['result_count']}\n"
+            f"Results file: {os.path.basename(record['output_file'])}\n"
+            + "-" * 50 + "\n\n")
+
+def format_summary_record(record):
+    """Serialize a keyword record as one line of the JSON Lines summary"""
+    data = {'keyword': record['keyword'], 'count': record['result_count'], 'status': record['status']}
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode('utf-8')
+
+def run(keywords, output_dir, progress_cb=None, excel_file=None):
+    """
+    Search for every keyword and save the results to output_dir
+    
+    Args:
+        keywords (list): Keywords to search for
+        output_dir (str): Directory to save the per-keyword JSON files and the summary
+        progress_cb (callable): Optional callback, called as progress_cb(done, total, keyword)
+            each time a keyword finishes
+        excel_file (str): Optional path of an Excel file that collects all products,
+            in input keyword order
+        
+    Returns:
+        bool: True if the batch completed, False otherwise
+    """
+    logger = logging.getLogger(__name__)
+    worker_threads = []
+    
+    try:
+        # Create output directory if it doesn't exist
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # Search each keyword once, even if it is listed several times
+        keywords = list(dict.fromkeys(keywords))
+        logger.info("Found %d keywords to search", len(keywords))
+        
+        # Stream all products into a single write-only workbook
+        workbook = sheet = None
+        if excel_file:
+            import openpyxl
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet('Products')
+            sheet.append(EXCEL_COLUMNS)
+        
+        # Summary entries are written in one go at the end
+        summary_file = os.path.join(output_dir, "search_summary.txt")
+        summary_header = (f"Direct Derma Search Summary - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                          + "=" * 80 + "\n\n")
+        summary_entries = []
+        summary_records = []
+        
+        output_files = [os.path.join(output_dir, f"{keyword.replace(' ', '_')}_results.json") for keyword in keywords]
+        
+        # Results left by an earlier run must not be mistaken for this run's
+        for output_file in output_files:
+            _remove_stale_output(output_file)
+        
+        finished = 0
+        
+        def keyword_finished(record):
+            nonlocal finished
+            finished += 1
+            logger.info("Finished keyword %d/%d: %s", finished, len(keywords), record['keyword'])
+            if progress_cb:
+                progress_cb(finished, len(keywords), record['keyword'])
+        
+        # Search the keywords concurrently; each search spends most of its time waiting on the network.
+        # The worker threads are recorded so that only this run's Chrome drivers are quit at the end
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(keywords))),
+                                initializer=lambda: worker_threads.append(threading.current_thread())) as executor:
+            futures = [executor.submit(_search_keyword, keyword, output_file)
+                       for keyword, output_file in zip(keywords, output_files)]
+            
+            # Keywords that failed or found nothing are done once searched, whatever the submission order
+            for future in as_completed(futures):
+                record = future.result()
+                if record['status'] == 'ERROR' or not record['urls']:
+                    keyword_finished(record)
+        
+        # Keep the records in input keyword order
+        records = [future.result() for future in futures]
+        
+        # Scrape the products of all keywords in one scraper process, so Scrapy and its
+        # reactor start once per batch rather than once per keyword
+        _scrape_records(records, on_finished=keyword_finished)
+        
+        for record in records:
+            keyword = record['keyword']
+            
+            if record['status'] == 'OK':
+                if sheet is not None:
+                    append_excel_rows(sheet, keyword, record['results'])
+                logger.info("Completed search for '%s'. Found %d products.", keyword, record['result_count'])
+            
+            # Check if the scraper wrote an output file despite the error
+            elif record['urls'] and os.path.exists(record['output_file']):
+                try:
+                    # Stream the partial results straight into the workbook while counting them
+                    if sheet is not None:
+                        result_count = append_excel_rows(sheet, keyword, iter_results(record['output_file']))
+                    else:
+                        result_count = count_results(record['output_file'])
+                    
+                    record.update(status='PARTIAL', result_count=result_count)
+                    logger.info("Despite error, found results for '%s'. Found %d products.", keyword, result_count)
+                except Exception as json_err:
+                    logger.warning("Output file exists but contains invalid JSON: %s", json_err)
+            
+            summary_entries.append(format_summary_entry(record))
+            summary_records.append(format_summary_record(record))
+        
+        with open(summary_file, 'w', buffering=1 << 16) as summary:
+            summary.write(summary_header)
+            summary.writelines(summary_entries)
+        
+        # Machine-readable copy of the summary, one JSON object per keyword
+        with open(os.path.join(output_dir, "search_summary.jsonl"), 'wb') as summary:
+            summary.writelines(summary_records)
+        
+        if workbook is not None:
+            workbook.save(excel_file)
+            logger.info("Results exported to Excel file: %s", excel_file)
+        
+        logger.info("Batch search completed. Summary saved to %s", summary_file)
+        return True
+        
+    except Exception as e:
+        logger.error("An error occurred: %s", e, exc_info=True)
+        return False
+    finally:
+        # Quit the Chrome drivers this run's worker threads started for their searches
+        search_products.close_driver(worker_threads)
+
 def main():
-    setup_logging()
+    setup_logging("batch_search.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Batch search Direct Derma products by keywords from a file')
@@ -74,6 +344,7 @@ def main():
     parser.add_argument('--column', help='Column name in Excel file to use for keywords (defaults to first column)')
     parser.add_argument('--output-dir', default='search_results', 
                         help='Directory to save results (default: search_results)')
+    parser.add_argument('--excel-output', help='Also save all results to this Excel file')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], 
                         default='INFO', help='Set the logging level')
     
@@ -87,113 +358,37 @@ def main():
         if args.input:
             # Check if input file exists
             if not os.path.exists(args.input):
-                logger.error(f"Error: Input file {args.input} not found")
+                logger.error("Error: Input file %s not found", args.input)
                 sys.exit(1)
             
             # Read keywords from text file
             keywords = read_keywords_from_txt(args.input)
-            logger.info(f"Reading keywords from text file: {args.input}")
+            logger.info("Reading keywords from text file: %s", args.input)
         else:  # args.excel
             # Check if Excel file exists
             if not os.path.exists(args.excel):
-                logger.error(f"Error: Excel file {args.excel} not found")
+                logger.error("Error: Excel file %s not found", args.excel)
                 sys.exit(1)
             
             # Read keywords from Excel file
             try:
                 keywords = read_keywords_from_excel(args.excel, args.column)
-                logger.info(f"Reading keywords from Excel file: {args.excel}")
+                logger.info("Reading keywords from Excel file: %s", args.excel)
             except (ImportError, ValueError) as e:
                 logger.error(str(e))
                 sys.exit(1)
         
-        # Create output directory if it doesn't exist
-        if not os.path.exists(args.output_dir):
-            os.makedirs(args.output_dir)
-            logger.info(f"Created output directory: {args.output_dir}")
+        if not run(keywords, args.output_dir, excel_file=args.excel_output):
+            sys.exit(1)
         
-        logger.info(f"Found {len(keywords)} keywords to search")
-        
-        # Create a summary file
         summary_file = os.path.join(args.output_dir, "search_summary.txt")
-        with open(summary_file, 'w') as summary:
-            summary.write(f"Direct Derma Search Summary - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            summary.write("=" * 80 + "\n\n")
-            
-            # Process each keyword
-            for i, keyword in enumerate(keywords, 1):
-                logger.info(f"Processing keyword {i}/{len(keywords)}: {keyword}")
-                # Define output file for this keyword
-                output_file = os.path.join(args.output_dir, f"{keyword.replace(' ', '_')}_results.json")
-                
-                # Run the search_products.py script for this keyword using the same Python interpreter as this script
-                cmd = [sys.executable, "search_products.py", "--keyword", keyword, "--output", output_file]
-                logger.info(f"Running command: {' '.join(cmd)}")
-                try:
-                    process = subprocess.run(cmd, check=True, capture_output=True, text=True)
-                    
-                    # Check if the process was successful
-                    if process.returncode == 0:
-                        # Extract the number of results from the output
-                        output_lines = process.stdout.split('\n')
-                        result_count = 0
-                        
-                        for line in output_lines:
-                            if "Found" in line and "matching products" in line:
-                                try:
-                                    result_count = int(line.split("Found")[1].split("matching")[0].strip())
-                                    break
-                                except (ValueError, IndexError):
-                                    pass
-                        
-                        logger.info(f"Completed search for '{keyword}'. Found {result_count} products.")
-                        
-                        # Write to summary file
-                        summary.write(f"Keyword: {keyword}\n")
-                        summary.write(f"Products found: {result_count}\n")
-                        summary.write(f"Results file: {os.path.basename(output_file)}\n")
-                        summary.write("-" * 50 + "\n\n")
-                        
-                    else:
-                        logger.error(f"Search for '{keyword}' failed with return code {process.returncode}")
-                        summary.write(f"Keyword: {keyword}\n")
-                        summary.write("Status: FAILED\n")
-                        summary.write(f"Error: Process returned code {process.returncode}\n")
-                        summary.write("-" * 50 + "\n\n")
-                    
-                except subprocess.CalledProcessError as e:
-                    logger.error(f"Error processing keyword '{keyword}': {str(e)}")
-                    logger.error(f"Stderr: {e.stderr}")
-                    
-                    # Check if output file exists despite the error
-                    if os.path.exists(output_file):
-                        try:
-                            with open(output_file, 'r') as f:
-                                data = json.load(f)
-                                result_count = len(data)
-                                
-                                # Write success to summary file if the output file exists and has valid JSON
-                                logger.info(f"Despite error, found results for '{keyword}'. Found {result_count} products.")
-                                summary.write(f"Keyword: {keyword}\n")
-                                summary.write(f"Products found: {result_count}\n")
-                                summary.write(f"Results file: {os.path.basename(output_file)}\n")
-                                summary.write("-" * 50 + "\n\n")
-                                continue
-                        except (json.JSONDecodeError, Exception) as json_err:
-                            logger.warning(f"Output file exists but contains invalid JSON: {str(json_err)}")
-                    
-                    # Write error to summary file
-                    summary.write(f"Keyword: {keyword}\n")
-                    summary.write("Status: ERROR\n")
-                    summary.write(f"Error message: {str(e)}\n")
-                    summary.write("-" * 50 + "\n\n")
-        
-        logger.info(f"Batch search completed. Summary saved to {summary_file}")
         print(f"\nBatch search completed. Results saved to {args.output_dir} directory.")
         print(f"Summary saved to {summary_file}")
+        if args.excel_output:
+            print(f"Excel results saved to {args.excel_output}")
         
     except Exception as e:
-        logger.error(f"An error occurred: {str(e)}", exc_info=True)
+        logger.error("An error occurred: %s", e, exc_info=True)
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -8,23 +8,15 @@ to clean up the project directory while preserving important data.
 
 import os
 import shutil
-import glob
 import logging
 import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
+from common_logging import setup_logging
 
-def setup_logging():
-    """Set up logging configuration"""
-    os.makedirs('logs', exist_ok=True)
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler(f"logs/cleanup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+# Number of threads used to stat directory trees
+DIR_SIZE_WORKERS = 8
 
 def cleanup_files(dry_run=False, preserve_latest=False):
     """
@@ -35,7 +27,7 @@ def cleanup_files(dry_run=False, preserve_latest=False):
         preserve_latest (bool): If True, preserve the most recent Excel file and results
     """
     logger = logging.getLogger(__name__)
-    logger.info(f"Starting cleanup process (dry run: {dry_run}, preserve latest: {preserve_latest})")
+    logger.info("Starting cleanup process (dry run: %s, preserve latest: %s)", dry_run, preserve_latest)
     
     # List of extensions to clean
     log_extensions = ['.log']
@@ -55,80 +47,90 @@ def cleanup_files(dry_run=False, preserve_latest=False):
         'bytes_freed': 0
     }
     
+    # Read the directory once and group the files by extension
+    files_by_ext = {}
+    dirs = set()
+    with os.scandir('.') as entries:
+        for entry in entries:
+            if entry.is_file():
+                files_by_ext.setdefault(os.path.splitext(entry.name)[1], []).append(entry)
+            elif entry.is_dir():
+                dirs.add(entry.name)
+    
     # Get the most recent Excel file if preserving latest
     latest_excel = None
     if preserve_latest:
-        excel_files = glob.glob('*.xlsx')
+        excel_files = files_by_ext.get('.xlsx', [])
         if excel_files:
-            latest_excel = max(excel_files, key=os.path.getmtime)
-            logger.info(f"Preserving latest Excel file: {latest_excel}")
+            latest_excel = max(excel_files, key=lambda e: e.stat().st_mtime).name
+            logger.info("Preserving latest Excel file: %s", latest_excel)
     
     # 1. Clean log files
     for ext in log_extensions:
-        for log_file in glob.glob(f'*{ext}'):
+        for log_file in files_by_ext.get(ext, []):
             if handle_file(log_file, dry_run, stats):
-                logger.info(f"Removed log file: {log_file}")
+                logger.info("Removed log file: %s", log_file.name)
     
     # 2. Clean temporary files
     for ext in temp_extensions:
-        for temp_file in glob.glob(f'*{ext}'):
+        for temp_file in files_by_ext.get(ext, []):
             if handle_file(temp_file, dry_run, stats):
-                logger.info(f"Removed temporary file: {temp_file}")
+                logger.info("Removed temporary file: %s", temp_file.name)
     
     # 3. Clean directories
     for dir_name in dirs_to_clean:
-        if os.path.exists(dir_name) and os.path.isdir(dir_name):
+        if dir_name in dirs:
             dir_size = get_dir_size(dir_name)
             if dry_run:
-                logger.info(f"Would remove directory: {dir_name} ({format_size(dir_size)})")
+                logger.info("Would remove directory: %s (%s)", dir_name, format_size(dir_size))
             else:
                 try:
                     shutil.rmtree(dir_name)
                     stats['directories_cleaned'] += 1
                     stats['bytes_freed'] += dir_size
-                    logger.info(f"Removed directory: {dir_name} ({format_size(dir_size)})")
+                    logger.info("Removed directory: %s (%s)", dir_name, format_size(dir_size))
                 except Exception as e:
-                    logger.error(f"Error removing directory {dir_name}: {str(e)}")
+                    logger.error("Error removing directory %s: %s", dir_name, e)
     
     # 4. Clean old JSON files that aren't in result directories
-    for json_file in glob.glob('*.json'):
+    for json_file in files_by_ext.get('.json', []):
         # Skip important configuration files
-        if json_file in ['scrapy.cfg', 'package.json', 'package-lock.json']:
+        if json_file.name in ['scrapy.cfg', 'package.json', 'package-lock.json']:
             continue
         
         # Keep main results files
-        if json_file == 'url_scrape_results.json':
+        if json_file.name == 'url_scrape_results.json':
             continue
             
         if handle_file(json_file, dry_run, stats):
-            logger.info(f"Removed JSON file: {json_file}")
+            logger.info("Removed JSON file: %s", json_file.name)
     
     # 5. Clean temporary HTML files
-    for html_file in glob.glob('*.html'):
+    for html_file in files_by_ext.get('.html', []):
         if handle_file(html_file, dry_run, stats):
-            logger.info(f"Removed HTML file: {html_file}")
+            logger.info("Removed HTML file: %s", html_file.name)
     
     # 6. Clean old Excel files if preserving_latest
     if preserve_latest and latest_excel:
-        for excel_file in glob.glob('*.xlsx'):
-            if excel_file != latest_excel:
+        for excel_file in files_by_ext.get('.xlsx', []):
+            if excel_file.name != latest_excel:
                 if handle_file(excel_file, dry_run, stats):
-                    logger.info(f"Removed old Excel file: {excel_file}")
+                    logger.info("Removed old Excel file: %s", excel_file.name)
     
     # Report results
-    logger.info(f"Cleanup completed:")
-    logger.info(f"  - Files deleted: {stats['files_deleted']}")
-    logger.info(f"  - Directories cleaned: {stats['directories_cleaned']}")
-    logger.info(f"  - Space freed: {format_size(stats['bytes_freed'])}")
+    logger.info("Cleanup completed:")
+    logger.info("  - Files deleted: %s", stats['files_deleted'])
+    logger.info("  - Directories cleaned: %s", stats['directories_cleaned'])
+    logger.info("  - Space freed: %s", format_size(stats['bytes_freed']))
     
     return stats
 
-def handle_file(file_path, dry_run, stats):
+def handle_file(entry, dry_run, stats):
     """
     Handle a single file (delete or report)
     
     Args:
-        file_path (str): Path to the file
+        entry (os.DirEntry): Directory entry of the file, whose cached stat is reused
         dry_run (bool): If True, only print information without deleting
         stats (dict): Statistics dictionary to update
         
@@ -136,24 +138,55 @@ def handle_file(file_path, dry_run, stats):
         bool: True if file was deleted or would be deleted, False otherwise
     """
     try:
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            if dry_run:
-                print(f"Would delete: {file_path} ({format_size(file_size)})")
-                return True
-            else:
-                os.remove(file_path)
-                stats['files_deleted'] += 1
-                stats['bytes_freed'] += file_size
-                return True
+        file_size = entry.stat().st_size
+        if dry_run:
+            print(f"Would delete: {entry.name} ({format_size(file_size)})")
+            return True
+        else:
+            os.unlink(entry.path)
+            stats['files_deleted'] += 1
+            stats['bytes_freed'] += file_size
+            return True
+    except FileNotFoundError:
+        # Already removed since the directory was scanned; nothing to do
+        return False
     except Exception as e:
-        logging.error(f"Error handling file {file_path}: {str(e)}")
+        logging.error("Error handling file %s: %s", entry.name, e)
     return False
 
+def _dir_size_one(path):
+    """
+    Sum the sizes of the files directly inside a directory
+    
+    A directory that cannot be read counts as empty, as with os.walk.
+    
+    Returns:
+        tuple: (total size in bytes, list of subdirectory paths)
+    """
+    total_size = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    try:
+                        total_size += entry.stat().st_size
+                    except FileNotFoundError:
+                        pass
+    except OSError as e:
+        logging.debug("Skipping unreadable directory %s: %s", path, e)
+        return 0, []
+    return total_size, subdirs
+
 def get_dir_size(path):
     """
     Calculate the total size of a directory in bytes
     
+    Subdirectories are queued to a thread pool as they are discovered, so the
+    stat calls of different directories overlap.
+    
     Args:
         path (str): Directory path
         
@@ -161,11 +194,14 @@ def get_dir_size(path):
         int: Total size in bytes
     """
     total_size = 0
-    for dirpath, dirnames, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if os.path.exists(fp):
-                total_size += os.path.getsize(fp)
+    with ThreadPoolExecutor(max_workers=DIR_SIZE_WORKERS) as executor:
+        pending = {executor.submit(_dir_size_one, path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                size, subdirs = future.result()
+                total_size += size
+                pending.update(executor.submit(_dir_size_one, sub) for sub in subdirs)
     return total_size
 
 def format_size(size_bytes):
@@ -185,7 +221,8 @@ def format_size(size_bytes):
     return f"{size_bytes:.2f} TB"
 
 def main():
-    setup_logging()
+    os.makedirs('logs', exist_ok=True)
+    setup_logging(f"logs/cleanup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Clean up temporary and log files')
@@ -203,7 +240,7 @@ def main():
             print("Run without --dry-run to actually delete the files.")
             
     except Exception as e:
-        logger.error(f"An error occurred during cleanup: {str(e)}", exc_info=True)
+        logger.error("An error occurred during cleanup: %s", e, exc_info=True)
         sys.exit(1)
 
 if __name__ == "__main__":
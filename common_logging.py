@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""
+Shared Logging Setup
+
+All the Direct Derma scripts log to their own file and to stdout in the same format.
+This module configures that once per process.
+"""
+
+import logging
+import sys
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+
+def setup_logging(log_file, level=logging.INFO):
+    """
+    Log to log_file and stdout, unless logging is already configured
+
+    Only the first call in a process installs handlers, so it is safe to call from
+    modules that import each other and on every Streamlit rerun. The log file is
+    only opened once something is logged.
+
+    Args:
+        log_file (str): Path of the log file
+        level (int): Root logger level
+    """
+    if logging.getLogger().handlers:
+        return
+
+    logging.basicConfig(
+        level=level,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.FileHandler(log_file, delay=True),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
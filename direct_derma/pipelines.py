@@ -1,6 +1,74 @@
+import json
+import queue
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Marks the end of the item stream for the writer thread
+_STOP = object()
+
 class PricePipeline:
+    def open_spider(self, spider):
+        # Optionally append every item to a JSON Lines file from a background thread,
+        # so serialization and disk writes overlap with the next page fetch
+        self.queue = None
+        self.writer = None
+        self.error = None
+        output = spider.settings.get('PRICE_JSONL_OUTPUT')
+        if output:
+            # Open the file here so a bad path fails the crawl instead of the writer thread
+            self.file = open(output, 'ab', buffering=1 << 16)
+            self.queue = queue.Queue(maxsize=32)
+            self.writer = threading.Thread(target=self.write_items, daemon=True)
+            self.writer.start()
+
+    def write_items(self):
+        """Drain the item queue into the JSON Lines file until the stop marker arrives"""
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+                if orjson is not None:
+                    self.file.write(orjson.dumps(item) + b"\n")
+                else:
+                    self.file.write((json.dumps(item, ensure_ascii=False) + "\n").encode('utf-8'))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.file.close()
+
+    def put(self, item, spider):
+        """
+        Hand an item to the writer thread without blocking forever
+        
+        If the writer has stopped, the error is logged once and JSON Lines output is
+        turned off for the rest of the crawl.
+        """
+        while self.writer.is_alive():
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+        spider.logger.error(f"JSON Lines writer stopped, no longer writing items: {self.error}")
+        self.writer = None
+
     def process_item(self, item, spider):
         # Clean and validate the price data
-        if 'price' in item:
+        if isinstance(item.get('price'), str):
             item['price'] = item['price'].replace('EUR', '').strip()
-        return item
\ No newline at end of file
+        if self.writer is not None:
+            self.put(dict(item), spider)
+        return item
+
+    def close_spider(self, spider):
+        if self.writer is not None:
+            self.put(_STOP, spider)
+        if self.writer is not None:
+            self.writer.join()
+            if self.error is not None:
+                spider.logger.error(f"JSON Lines writer failed: {self.error}")
@@ -40,9 +40,12 @@ DEFAULT_REQUEST_HEADERS = {
 # }
 
 # Configure item pipelines
-# ITEM_PIPELINES = {
-#     'direct_derma.pipelines.SomePipeline': 300,
-# }
+ITEM_PIPELINES = {
+    'direct_derma.pipelines.PricePipeline': 300,
+}
+
+# Also append every item to this JSON Lines file (disabled when None)
+PRICE_JSONL_OUTPUT = None
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 AUTOTHROTTLE_ENABLED = True
@@ -57,4 +60,13 @@ HTTPCACHE_ENABLED = True
 HTTPCACHE_EXPIRATION_SECS = 86400  # 24 hours
 HTTPCACHE_DIR = 'httpcache'
 HTTPCACHE_IGNORE_HTTP_CODES = []
-HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
\ No newline at end of file
+# Filesystem storage is kept because batch searches run several product_price crawls
+# at once (run_scraper.py --jobs), each opening the cache on its own, and the DBM/LevelDB
+# backends only allow a single writer per spider's cache file
+HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+
+# Save a gzipped snapshot of each page rendered with Selenium to debug_output/
+DEBUG_SAVE_HTML = False
+
+# Maximum number of headless Chrome instances rendering pages at the same time
+SELENIUM_POOL_SIZE = 4
@@ -3,15 +3,30 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
-import time
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import re
 import os
+import gzip
 import json
-from datetime import datetime
+import queue
+import threading
+import time
 from scrapy.spidermiddlewares.httperror import HttpError
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import threads
 from twisted.internet.error import DNSLookupError, TimeoutError
 
+# Patterns used for every parsed page
+_URL_SANITIZE = re.compile(r'[^\w]')
+_PRICE_NUM = re.compile(r'\d+[,.]\d+|\d+')
+_CURRENCY = re.compile(r'[A-Z]{3}')
+
+# Format of the timestamp stored with every item
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 class ProductPriceSpider(scrapy.Spider):
     name = "product_price"
     allowed_domains = ["directdermasupplies.com"]
@@ -27,6 +42,15 @@ class ProductPriceSpider(scrapy.Spider):
         'RETRY_TIMES': 3,
         'HTTPERROR_ALLOW_ALL': True,  # Allow processing non-200 responses
     }
+    
+    # CSS selectors tried, in order, to find the price in the page HTML
+    PRICE_SELECTORS = [
+        '.price.price--product-page::text',
+        '.product__price-wrap .price::text',
+        '.price--product-page::text',
+        'div.price::text',
+        '.product__price-wrap div.price::text'
+    ]
 
     def __init__(self, input_file=None, *args, **kwargs):
         super(ProductPriceSpider, self).__init__(*args, **kwargs)
@@ -48,13 +72,16 @@ class ProductPriceSpider(scrapy.Spider):
         # Add user agent to match the one in settings.py
         chrome_options.add_argument("user-agent=direct_derma_price_scraper (+http://www.yourdomain.com)")
         
-        # Initialize the Chrome driver
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+        self.chrome_options = chrome_options
+        
+        # Pool of Chrome drivers, started on demand up to SELENIUM_POOL_SIZE so that
+        # pages needing JavaScript are rendered in parallel on the reactor thread pool
+        self.driver_pool = queue.Queue()
+        self.drivers = []
+        self.driver_lock = threading.Lock()
         
-        # Create a debug directory if it doesn't exist
+        # Debug snapshots go here; the directory is only created once one is saved
         self.debug_dir = "debug_output"
-        if not os.path.exists(self.debug_dir):
-            os.makedirs(self.debug_dir)
 
     def start_requests(self):
         for url in self.start_urls:
@@ -65,7 +92,10 @@ class ProductPriceSpider(scrapy.Spider):
                 meta={'dont_redirect': True, 'handle_httpstatus_list': [404, 500, 503]}
             )
 
-    def parse(self, response):
+    async def parse(self, response):
+        # Format the item timestamp once per page
+        ts = time.strftime(TIMESTAMP_FORMAT)
+        
         # Check if response is an error
         if response.status >= 400:
             self.logger.error(f"Error {response.status} when accessing {response.url}")
@@ -74,138 +104,147 @@ class ProductPriceSpider(scrapy.Spider):
                 'product_name': None,
                 'price': None,
                 'currency': None,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'timestamp': ts,
                 'error': f"HTTP Error: {response.status}"
             }
             
-        # Use Selenium to get the page
+        # Fast path: the price is often server-rendered, so try the HTML scrapy already fetched
+        product_name = response.css('h1::text').get()
+        price_text = next((text for text in (response.css(selector).get() for selector in self.PRICE_SELECTORS)
+                           if text and text.strip()), None)
+        if product_name and product_name.strip() and price_text:
+            self.logger.info("Found price in static HTML: %s", price_text.strip())
+            return self.build_result(response.url, product_name.strip(), price_text.strip(), ts)
+        
+        # Render the page with Selenium in a worker thread so other requests keep flowing
+        return await maybe_deferred_to_future(threads.deferToThread(self.parse_rendered, response.url, ts))
+    
+    def acquire_driver(self):
+        """Take an idle driver from the pool, starting a new one if the pool isn't full yet"""
+        try:
+            return self.driver_pool.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self.driver_lock:
+            if len(self.drivers) < self.settings.getint('SELENIUM_POOL_SIZE', 4):
+                driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=self.chrome_options)
+                self.drivers.append(driver)
+                return driver
+        
+        return self.driver_pool.get()
+    
+    def parse_rendered(self, url, ts):
+        """Load the page in a pooled Chrome driver and extract the product name and price"""
+        driver = self.acquire_driver()
         try:
-            self.driver.get(response.url)
+            driver.get(url)
             
-            # Wait for JavaScript to load
-            time.sleep(5)
+            # Wait until the price or the product title has rendered instead of a fixed delay
+            try:
+                WebDriverWait(driver, 10).until(EC.any_of(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, ".price.price--product-page")),
+                    EC.presence_of_element_located((By.CSS_SELECTOR, "h1"))
+                ))
+            except TimeoutException:
+                self.logger.warning(f"Timed out waiting for {url} to render")
             
-            # Save page source for debugging with timestamp and sanitized URL
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            sanitized_url = re.sub(r'[^\w]', '_', response.url)[:50]  # Take first 50 chars to avoid filename too long
-            debug_file = os.path.join(self.debug_dir, f"{timestamp}_{sanitized_url}.html")
-            with open(debug_file, "w", encoding="utf-8") as f:
-                f.write(self.driver.page_source)
+            # Save the gzipped page source for debugging with timestamp and sanitized URL, if enabled
+            if self.settings.getbool('DEBUG_SAVE_HTML', False):
+                timestamp = time.strftime("%Y%m%d_%H%M%S")
+                sanitized_url = _URL_SANITIZE.sub('_', url)[:50]  # Take first 50 chars to avoid filename too long
+                os.makedirs(self.debug_dir, exist_ok=True)
+                debug_file = os.path.join(self.debug_dir, f"{timestamp}_{sanitized_url}.html.gz")
+                with gzip.open(debug_file, "wt", encoding="utf-8", compresslevel=1) as f:
+                    f.write(driver.page_source)
             
-            self.logger.info("Page title: %s", self.driver.title)
+            self.logger.info("Page title: %s", driver.title)
             
             price = None
             product_name = None
             
             # Try to extract product name
             try:
-                product_name_element = self.driver.find_element(By.CSS_SELECTOR, "h1")
+                product_name_element = driver.find_element(By.CSS_SELECTOR, "h1")
                 product_name = product_name_element.text.strip()
                 self.logger.info(f"Found product name: {product_name}")
             except Exception as e:
                 self.logger.error(f"Failed to extract product name: {str(e)}")
             
-            # Try multiple methods to extract the price
-            try:
-                # Method 1: Look for the product price with class "price price--product-page"
-                price_element = self.driver.find_element(By.CSS_SELECTOR, ".price.price--product-page")
-                price_text = price_element.text.strip()
-                if price_text:
-                    price = price_text
-                    self.logger.info("Found price with method 1: %s", price)
-            except Exception as e:
-                self.logger.error("Method 1 failed: %s", str(e))
-                
-                try:
-                    # Method 2: Try a more generic XPath for price elements
-                    price_element = self.driver.find_element(By.XPATH, "//*[contains(@class, 'price') and contains(@class, 'product')]")
-                    price_text = price_element.text.strip()
-                    if price_text:
-                        price = price_text
-                        self.logger.info("Found price with method 2: %s", price)
-                except Exception as e:
-                    self.logger.error("Method 2 failed: %s", str(e))
-                    
-                    try:
-                        # Method 3: Try to find any element containing "EUR" followed by digits
-                        elements = self.driver.find_elements(By.XPATH, "//*[contains(text(), 'EUR')]")
-                        for elem in elements:
-                            text = elem.text.strip()
-                            if 'EUR' in text:
-                                price = text
-                                self.logger.info("Found price with method 3: %s", price)
-                                break
-                    except Exception as e:
-                        self.logger.error("Method 3 failed: %s", str(e))
+            # Look for the product price with class "price price--product-page" or any element
+            # whose classes mention both price and product, in a single query
+            candidates = driver.find_elements(
+                By.CSS_SELECTOR, ".price.price--product-page, [class*='price'][class*='product']")
+            price = next((text for text in (c.text.strip() for c in candidates) if text), None)
+            if price:
+                self.logger.info("Found price element: %s", price)
+            else:
+                # Fall back to any element containing "EUR"
+                elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'EUR')]")
+                price = next((text for text in (e.text.strip() for e in elements) if 'EUR' in text), None)
+                if price:
+                    self.logger.info("Found price from EUR text: %s", price)
             
             # If all direct methods failed, try using scrapy selectors on the page source
             if not price:
-                page_source = self.driver.page_source
+                page_source = driver.page_source
                 selenium_response = scrapy.http.HtmlResponse(
-                    url=response.url,
+                    url=url,
                     body=page_source.encode('utf-8'),
                     encoding='utf-8'
                 )
                 
                 # Try multiple CSS selectors
-                selectors = [
-                    '.price.price--product-page::text',
-                    '.product__price-wrap .price::text',
-                    '.price--product-page::text',
-                    'div.price::text',
-                    '.product__price-wrap div.price::text'
-                ]
-                
-                for selector in selectors:
+                for selector in self.PRICE_SELECTORS:
                     price_text = selenium_response.css(selector).get()
                     if price_text:
                         price = price_text.strip()
                         self.logger.info("Found price with selector %s: %s", selector, price)
                         break
             
-            # Clean up the price if found
-            if price:
-                # Extract number from price (e.g., "EUR 240,00" -> "240.00")
-                number_match = re.search(r'(\d+[,.]\d+|\d+)', price)
-                if number_match:
-                    price_number = number_match.group(0)
-                    # Convert comma to dot for decimal
-                    price_number = price_number.replace(',', '.')
-                    self.logger.info("Cleaned price: %s", price_number)
-                    price = price_number
-            
-            # Extract currency if present
-            currency = None
-            if price and 'price_text' in locals():
-                currency_match = re.search(r'([A-Z]{3})', price_text)
-                if currency_match:
-                    currency = currency_match.group(0)
-            
-            self.logger.info("Final price extracted: %s", price)
-            
-            # Create result item
-            result = {
-                'product_url': response.url,
-                'product_name': product_name,
-                'price': price,
-                'currency': currency,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-            return result
+            return self.build_result(url, product_name, price, ts)
             
         except Exception as e:
-            self.logger.error(f"Error processing {response.url}: {str(e)}")
+            self.logger.error(f"Error processing {url}: {str(e)}")
             return {
-                'product_url': response.url,
+                'product_url': url,
                 'price': None,
                 'error': str(e),
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'timestamp': ts
             }
+        finally:
+            self.driver_pool.put(driver)
+    
+    def build_result(self, url, product_name, price, ts):
+        """Build the result item, cleaning the raw price text and extracting its currency"""
+        currency = None
+        if price:
+            # Extract currency if present
+            currency_match = _CURRENCY.search(price)
+            if currency_match:
+                currency = currency_match.group(0)
+            
+            # Extract number from price (e.g., "EUR 240,00" -> "240.00")
+            number_match = _PRICE_NUM.search(price)
+            if number_match:
+                # Convert comma to dot for decimal
+                price = number_match.group(0).replace(',', '.')
+                self.logger.info("Cleaned price: %s", price)
+        
+        self.logger.info("Final price extracted: %s", price)
+        
+        return {
+            'product_url': url,
+            'product_name': product_name,
+            'price': price,
+            'currency': currency,
+            'timestamp': ts
+        }
     
     def errback_handler(self, failure):
         """Handle request failures"""
         request = failure.request
+        ts = time.strftime(TIMESTAMP_FORMAT)
         
         if failure.check(HttpError):
             response = failure.value.response
@@ -214,7 +253,7 @@ class ProductPriceSpider(scrapy.Spider):
                 'product_url': request.url,
                 'price': None,
                 'error': f"HTTP Error: {response.status}",
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'timestamp': ts
             }
         
         elif failure.check(DNSLookupError):
@@ -223,7 +262,7 @@ class ProductPriceSpider(scrapy.Spider):
                 'product_url': request.url,
                 'price': None,
                 'error': "DNS Lookup Error",
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'timestamp': ts
             }
         
         elif failure.check(TimeoutError):
@@ -232,7 +271,7 @@ class ProductPriceSpider(scrapy.Spider):
                 'product_url': request.url,
                 'price': None,
                 'error': "Timeout Error",
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'timestamp': ts
             }
         
         else:
@@ -241,9 +280,10 @@ class ProductPriceSpider(scrapy.Spider):
                 'product_url': request.url,
                 'price': None,
                 'error': f"Unknown error: {repr(failure)}",
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'timestamp': ts
             }
             
     def closed(self, reason):
-        # Close the browser when spider is closed
-        self.driver.quit()
\ No newline at end of file
+        # Close every browser when spider is closed
+        for driver in self.drivers:
+            driver.quit()
\ No newline at end of file
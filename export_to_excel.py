@@ -13,30 +13,42 @@ import argparse
 import os
 import sys
 import logging
-import json
-import glob
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import openpyxl
 from datetime import datetime
+from common_logging import setup_logging
 
-def setup_logging():
-    """Set up logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("export_excel.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+# Maximum number of result files read at the same time
+MAX_WORKERS = 16
 
 def load_json_data(file_path):
-    """Load data from a JSON file"""
+    """
+    Load the products of a JSON results file into a DataFrame, keeping values as stored
+    
+    Prefers the Parquet copy run_scraper.py saves next to the JSON file, as long as
+    it is not older than the JSON.
+    """
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    try:
+        if os.stat(parquet_path).st_mtime_ns >= os.stat(file_path).st_mtime_ns:
+            return pd.read_parquet(parquet_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable Parquet copy {parquet_path}: {str(e)}")
+    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return pd.read_json(file_path, orient='records', dtype=False, convert_dates=False)
     except Exception as e:
         logging.error(f"Error reading {file_path}: {str(e)}")
-        return []
+        return pd.DataFrame()
+
+def load_keyword_products(file_path):
+    """Load the products of a JSON results file, tagging each with the file's keyword"""
+    df = load_json_data(file_path)
+    df['keyword'] = os.path.basename(file_path)[:-len('_results.json')]
+    return df
 
 def export_to_excel(input_dir, output_file):
     """
@@ -54,7 +66,9 @@ def export_to_excel(input_dir, output_file):
         return False
     
     # Find all JSON files in the input directory
-    json_files = glob.glob(os.path.join(input_dir, "*_results.json"))
+    with os.scandir(input_dir) as entries:
+        json_files = [entry.path for entry in entries
+                      if entry.name.endswith('_results.json') and entry.is_file()]
     
     if not json_files:
         logger.warning(f"No JSON result files found in {input_dir}")
@@ -62,25 +76,16 @@ def export_to_excel(input_dir, output_file):
     
     logger.info(f"Found {len(json_files)} JSON files to process")
     
-    # Collect all data
-    all_data = []
+    # Load one DataFrame per file, reading the files in parallel but keeping their order
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(json_files))) as executor:
+        frames = list(executor.map(load_keyword_products, json_files))
     
-    for json_file in json_files:
-        keyword = os.path.basename(json_file).replace('_results.json', '')
-        data = load_json_data(json_file)
-        
-        # Add keyword information to each product
-        for product in data:
-            product['keyword'] = keyword
-            all_data.append(product)
+    df = pd.concat(frames, ignore_index=True, copy=False)
     
-    if not all_data:
+    if df.empty:
         logger.warning("No product data found in the JSON files")
         return False
     
-    # Convert to DataFrame
-    df = pd.DataFrame(all_data)
-    
     # Reorder and select columns
     columns = ['keyword', 'product_name', 'price', 'currency', 'product_url', 'timestamp']
     
@@ -94,9 +99,17 @@ def export_to_excel(input_dir, output_file):
     
     df = df[columns]
     
-    # Save to Excel
+    # Missing values become empty cells, as with DataFrame.to_excel
+    df = df.astype(object).where(df.notna(), None)
+    
+    # Save to Excel, streaming the rows through a write-only workbook
     try:
-        df.to_excel(output_file, index=False, sheet_name='Products')
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet('Products')
+        sheet.append(columns)
+        for row in df.itertuples(index=False, name=None):
+            sheet.append(row)
+        workbook.save(output_file)
         logger.info(f"Successfully exported {len(df)} products to {output_file}")
         return True
     except Exception as e:
@@ -104,7 +117,7 @@ def export_to_excel(input_dir, output_file):
         return False
 
 def main():
-    setup_logging()
+    setup_logging("export_excel.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Export search results to Excel')
@@ -13,21 +13,58 @@ import os
 import sys
 import logging
 import json
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from common_logging import setup_logging
 
-def setup_logging():
-    """Set up logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("generate_summary.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+# Maximum number of result files read at the same time
+MAX_WORKERS = 16
+
+# One reusable simdjson parser per worker thread; a document is only valid until
+# its parser loads the next file
+_local = threading.local()
+
+def load_results(file_path):
+    """
+    Parse a JSON results file
+    
+    With pysimdjson the products are returned as a lazy document, so only the fields
+    that are read (the first few product names and prices) become Python objects.
+    """
+    if simdjson is not None:
+        if not hasattr(_local, 'parser'):
+            _local.parser = simdjson.Parser()
+        return _local.parser.load(file_path)
+    with open(file_path, 'rb') as f:
+        return _loads(f.read())
+
+def summarize_file(file_path):
+    """
+    Read the product count and the first 5 products of a JSON results file
+    
+    Returns:
+        tuple: (result_count, list of (name, price, currency) tuples)
+    """
+    data = load_results(file_path)
+    products = [(product.get('product_name', 'Unknown'), product.get('price', 'N/A'), product.get('currency', ''))
+                for product in itertools.islice(data, 5)]
+    return len(data), products
 
 def main():
-    setup_logging()
+    setup_logging("generate_summary.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Generate summary based on existing JSON result files')
@@ -54,66 +91,71 @@ def main():
     
     try:
         # Find all JSON files in the input directory
-        json_files = [f for f in os.listdir(args.input_dir) if f.endswith('_results.json')]
+        with os.scandir(args.input_dir) as entries:
+            json_files = [entry.name for entry in entries
+                          if entry.name.endswith('_results.json') and entry.is_file()]
         
         if not json_files:
             logger.warning(f"No JSON result files found in {args.input_dir}")
             sys.exit(0)
         
         # Extract keywords from filenames (remove _results.json suffix)
-        keywords = [os.path.splitext(f)[0].replace('_results', '') for f in json_files]
+        keywords = [f[:-len('_results.json')] for f in json_files]
         
         logger.info(f"Found {len(json_files)} result files for keywords: {', '.join(keywords)}")
         
-        # Create a summary file
-        with open(args.output, 'w') as summary:
-            summary.write(f"Direct Derma Search Summary (Updated) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            summary.write("=" * 80 + "\n\n")
+        # Build the summary in memory and write it in one go at the end
+        lines = [
+            f"Direct Derma Search Summary (Updated) - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+            "=" * 80 + "\n\n",
+        ]
+        
+        # Read the files in parallel, then add their entries in directory order
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(json_files))) as executor:
+            futures = [executor.submit(summarize_file, os.path.join(args.input_dir, json_file))
+                       for json_file in json_files]
+        
+        # Process each JSON file
+        for json_file, keyword, future in zip(json_files, keywords, futures):
+            file_path = os.path.join(args.input_dir, json_file)
             
-            # Process each JSON file
-            for json_file in json_files:
-                keyword = os.path.splitext(json_file)[0].replace('_results', '')
-                file_path = os.path.join(args.input_dir, json_file)
-                
+            try:
+                # Read the JSON file
                 try:
-                    # Read the JSON file
-                    with open(file_path, 'r') as f:
-                        try:
-                            data = json.load(f)
-                            result_count = len(data)
-                            
-                            # Write to summary file
-                            summary.write(f"Keyword: {keyword}\n")
-                            summary.write(f"Products found: {result_count}\n")
-                            summary.write(f"Results file: {json_file}\n")
-                            
-                            # Add product names if available
-                            if result_count > 0:
-                                summary.write("Products:\n")
-                                for i, product in enumerate(data[:5], 1):  # List first 5 products
-                                    name = product.get('product_name', 'Unknown')
-                                    price = product.get('price', 'N/A')
-                                    currency = product.get('currency', '')
-                                    summary.write(f"  {i}. {name} - {currency} {price}\n")
-                                
-                                if result_count > 5:
-                                    summary.write(f"  ... and {result_count - 5} more products\n")
-                            
-                            summary.write("-" * 50 + "\n\n")
-                            
-                        except json.JSONDecodeError:
-                            logger.warning(f"Invalid JSON in file: {file_path}")
-                            summary.write(f"Keyword: {keyword}\n")
-                            summary.write("Status: ERROR\n")
-                            summary.write(f"Error: Invalid JSON format in file\n")
-                            summary.write("-" * 50 + "\n\n")
-                            
-                except Exception as e:
-                    logger.error(f"Error processing file {file_path}: {str(e)}")
-                    summary.write(f"Keyword: {keyword}\n")
-                    summary.write("Status: ERROR\n")
-                    summary.write(f"Error: {str(e)}\n")
-                    summary.write("-" * 50 + "\n\n")
+                    result_count, products = future.result()
+                    
+                    # Add to summary
+                    lines.append(f"Keyword: {keyword}\n"
+                                 f"Products found: {result_count}\n"
+                                 f"Results file: {json_file}\n")
+                    
+                    # Add product names if available
+                    if result_count > 0:
+                        lines.append("Products:\n")
+                        lines.extend(f"  {i}. {name} - {currency} {price}\n"  # List first 5 products
+                                     for i, (name, price, currency) in enumerate(products, 1))
+                        
+                        if result_count > 5:
+                            lines.append(f"  ... and {result_count - 5} more products\n")
+                    
+                    lines.append("-" * 50 + "\n\n")
+                    
+                except ValueError:
+                    logger.warning(f"Invalid JSON in file: {file_path}")
+                    lines.append(f"Keyword: {keyword}\n"
+                                 "Status: ERROR\n"
+                                 "Error: Invalid JSON format in file\n"
+                                 + "-" * 50 + "\n\n")
+                    
+            except Exception as e:
+                logger.error(f"Error processing file {file_path}: {str(e)}")
+                lines.append(f"Keyword: {keyword}\n"
+                             "Status: ERROR\n"
+                             f"Error: {str(e)}\n"
+                             + "-" * 50 + "\n\n")
+        
+        with open(args.output, 'w') as summary:
+            summary.write(''.join(lines))
         
         logger.info(f"Summary generated successfully: {args.output}")
         print(f"\nSummary generated successfully: {args.output}")
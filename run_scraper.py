@@ -7,10 +7,16 @@ It allows you to:
 1. Scrape a single URL
 2. Scrape multiple URLs from a file
 3. Set the output file format and location
+4. Run several crawls, each with its own output file, in a single process
 
 Usage:
     python run_scraper.py --url URL [--output OUTPUT_FILE]
     python run_scraper.py --input INPUT_FILE [--output OUTPUT_FILE]
+    python run_scraper.py --input - [--output OUTPUT_FILE] < INPUT_FILE
+    python run_scraper.py --jobs JOBS_FILE
+
+JOBS_FILE (or - for stdin) is a JSON object mapping each output file to its list of URLs.
+A line starting with CRAWL_FINISHED_PREFIX is printed to stdout as each of its crawls ends.
 """
 
 import argparse
@@ -19,41 +25,169 @@ import sys
 import logging
 import json
 import subprocess
-from scrapy.crawler import CrawlerProcess
+from scrapy.crawler import Crawler, CrawlerProcess, CrawlerRunner
 from scrapy.utils.project import get_project_settings
+from common_logging import setup_logging
+
+# Maximum number of crawls from a --jobs file running at the same time; each one
+# starts its own pool of Chrome drivers
+MAX_CONCURRENT_CRAWLS = 4
+
+# Printed before the output file of each finished --jobs crawl, so a parent process
+# can report progress while the batch is still running
+CRAWL_FINISHED_PREFIX = "CRAWL FINISHED: "
+
+def feed_settings(output):
+    """FEEDS setting that saves the scraped items to output as a JSON array"""
+    return {
+        output: {
+            'format': 'json',
+            'encoding': 'utf8',
+            'overwrite': True,
+        },
+    }
+
+def write_parquet_sidecar(json_path):
+    """
+    Save a Parquet copy of a JSON results file next to it
+    
+    export_to_excel reads the sidecar instead of parsing the JSON again. Skipped
+    (with a warning) when pandas or pyarrow is not installed.
+    """
+    logger = logging.getLogger(__name__)
+    parquet_path = os.path.splitext(json_path)[0] + '.parquet'
+    try:
+        import pandas as pd
+        df = pd.read_json(json_path, orient='records', dtype=False, convert_dates=False)
+        df.to_parquet(parquet_path, index=False)
+        logger.info(f"Saved Parquet copy of the results to {parquet_path}")
+    except Exception as e:
+        logger.warning(f"Could not write Parquet copy of {json_path}: {str(e)}")
 
-def setup_logging():
-    """Set up logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("scraper.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+def verify_output(output, item_count, write_sidecar=True):
+    """Log how many results a crawl saved to output and, if write_sidecar is set, write its Parquet copy"""
+    logger = logging.getLogger(__name__)
+    
+    # Take the result count from the crawl stats instead of parsing the file again
+    try:
+        output_size = os.stat(output).st_size
+        logger.info(f"Scraping complete. Found {item_count} results ({output_size} bytes).")
+        if item_count == 0:
+            logger.warning("No data was scraped. Check the URLs or spider configuration.")
+        elif write_sidecar and output.endswith('.json'):
+            write_parquet_sidecar(output)
+    except FileNotFoundError:
+        logger.error(f"Output file {output} was not created")
+
+def crawl_all(jobs, settings, on_finished=None):
+    """
+    Run one product_price crawl per output file in a single Twisted reactor
+    
+    The reactor and the project are only set up once for the whole batch, instead of
+    once per keyword in a separate scraper process.
+    
+    Args:
+        jobs (dict): Maps each output file to the list of URLs to scrape into it
+        settings (Settings): Project settings shared by every crawl
+        on_finished (callable): Optional callback, called as on_finished(output, item_count)
+            as each crawl ends, whether it succeeded or not
+        
+    Returns:
+        dict: Maps each output file to the number of items scraped into it
+    """
+    logger = logging.getLogger(__name__)
+    
+    # CrawlerRunner leaves installing the reactor to the caller
+    from scrapy.utils.reactor import install_reactor
+    if settings.get('TWISTED_REACTOR'):
+        install_reactor(settings['TWISTED_REACTOR'])
+    from twisted.internet import defer, reactor
+    
+    runner = CrawlerRunner(settings)
+    spidercls = runner.spider_loader.load('product_price')
+    semaphore = defer.DeferredSemaphore(MAX_CONCURRENT_CRAWLS)
+    crawlers = {}
+    
+    def crawl(output, urls):
+        # Each crawl gets its own copy of the settings so it can write its own feed
+        crawl_settings = settings.copy()
+        crawl_settings.set('FEEDS', feed_settings(output))
+        crawler = Crawler(spidercls, crawl_settings)
+        crawlers[output] = crawler
+        logger.info(f"Starting crawl of {len(urls)} URLs, output will be saved to {output}")
+        d = runner.crawl(crawler, start_urls=urls)
+        d.addErrback(lambda failure: logger.error(f"Crawl for {output} failed: {failure.getErrorMessage()}"))
+        if on_finished:
+            d.addCallback(lambda _: on_finished(output, crawler.stats.get_value('item_scraped_count', 0)))
+        return d
+    
+    crawls = [semaphore.run(crawl, output, urls) for output, urls in jobs.items() if urls]
+    if not crawls:
+        # The DeferredList would fire at once and stop the reactor before it runs
+        logger.warning("No URLs to scrape in the jobs")
+        return {}
+    defer.DeferredList(crawls, consumeErrors=True).addBoth(lambda _: reactor.stop())
+    reactor.run()  # Blocks until every crawl has finished
+    
+    return {output: crawler.stats.get_value('item_scraped_count', 0)
+            for output, crawler in crawlers.items()}
+
+def read_jobs(path):
+    """Read a jobs file (or stdin for -) mapping output files to lists of URLs"""
+    if path == '-':
+        return json.load(sys.stdin)
+    with open(path, 'r') as f:
+        return json.load(f)
 
 def main():
-    setup_logging()
+    setup_logging("scraper.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Run Direct Derma Price Scraper')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--url', help='URL to scrape')
-    group.add_argument('--input', help='File containing URLs to scrape (one URL per line)')
+    group.add_argument('--input', help='File containing URLs to scrape (one URL per line), or - to read them from stdin')
+    group.add_argument('--jobs', help='JSON file mapping output files to the URLs to scrape into them, '
+                                      'or - to read it from stdin')
     parser.add_argument('--output', default='price_data.json', help='Output file (default: price_data.json)')
+    parser.add_argument('--jsonl', help='Also append every result to this JSON Lines file (not with --jobs)')
     parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], 
                         default='INFO', help='Set the logging level')
     
     args = parser.parse_args()
     
+    # Every --jobs crawl runs its own PricePipeline, and their buffered appends to one
+    # file would interleave mid-record
+    if args.jobs and args.jsonl:
+        parser.error("--jsonl cannot be combined with --jobs")
+    
     # Set log level
     logging.getLogger().setLevel(getattr(logging, args.log_level))
     
     # Check if input file exists
-    if args.input and not os.path.exists(args.input):
-        logger.error(f"Error: Input file {args.input} not found")
-        sys.exit(1)
+    for path in (args.input, args.jobs):
+        if path and path != '-' and not os.path.exists(path):
+            logger.error(f"Error: Input file {path} not found")
+            sys.exit(1)
+    
+    if args.jobs:
+        try:
+            settings = get_project_settings()
+            
+            jobs = read_jobs(args.jobs)
+            logger.info(f"Read {len(jobs)} crawl jobs from {args.jobs}")
+            
+            # No Parquet copies here: writing one re-parses the whole JSON file on the reactor
+            # thread, stalling the other crawls, and batch_search never reads them
+            def crawl_finished(output, item_count):
+                verify_output(output, item_count, write_sidecar=False)
+                print(f"{CRAWL_FINISHED_PREFIX}{output}", flush=True)
+            
+            crawl_all(jobs, settings, on_finished=crawl_finished)
+        except Exception as e:
+            logger.error(f"An error occurred: {str(e)}", exc_info=True)
+            sys.exit(1)
+        return
     
     try:
         # Initialize the crawler process with project settings
@@ -62,7 +196,11 @@ def main():
         # Set up the input file parameter
         spider_kwargs = {}
         
-        if args.input:
+        if args.input == '-':
+            # Pass the URLs straight to the spider instead of through a file
+            spider_kwargs['start_urls'] = [line.strip() for line in sys.stdin if line.strip()]
+            logger.info(f"Read {len(spider_kwargs['start_urls'])} URLs from stdin")
+        elif args.input:
             if not os.path.exists(args.input):
                 logger.error(f"Input file {args.input} not found")
                 sys.exit(1)
@@ -80,33 +218,21 @@ def main():
         logger.info(f"Starting scraper, output will be saved to {args.output}")
         
         # Configure output
-        process.settings.set('FEEDS', {
-            args.output: {
-                'format': 'json',
-                'encoding': 'utf8',
-                'overwrite': True,
-            },
-        })
+        process.settings.set('FEEDS', feed_settings(args.output))
+        
+        if args.jsonl:
+            process.settings.set('PRICE_JSONL_OUTPUT', args.jsonl)
         
-        process.crawl('product_price', **spider_kwargs)
+        crawler = process.create_crawler('product_price')
+        process.crawl(crawler, **spider_kwargs)
         process.start()  # The script will block here until the crawling is finished
         
         # Clean up temporary file if needed
         if args.url and os.path.exists('temp_url.txt'):
             os.remove('temp_url.txt')
         
-        # Verify the output file exists and has content
-        if os.path.exists(args.output):
-            try:
-                with open(args.output, 'r') as f:
-                    data = json.load(f)
-                logger.info(f"Scraping complete. Found {len(data)} results.")
-                if len(data) == 0:
-                    logger.warning("No data was scraped. Check the URLs or spider configuration.")
-            except json.JSONDecodeError:
-                logger.error(f"Output file {args.output} does not contain valid JSON")
-        else:
-            logger.error(f"Output file {args.output} was not created")
+        # Verify the output file exists
+        verify_output(args.output, crawler.stats.get_value('item_scraped_count', 0))
         
         logger.info(f"Scraping complete. Results saved to {args.output}")
     
@@ -7,15 +7,23 @@ by keyword and outputs the prices of all matching products.
 
 Usage:
     python search_products.py --keyword KEYWORD [--output OUTPUT_FILE]
+
+It can also be imported: search_products() runs the search in the calling process,
+and scrape_product_prices() scrapes the prices in a run_scraper.py subprocess.
+batch_search.py calls search_products() for every keyword and then scrape_batch()
+once, so all keywords are scraped by a single run_scraper.py subprocess.
 """
 
 import argparse
+import atexit
 import os
 import sys
 import logging
 import json
-import tempfile
-import time
+import threading
+from urllib.parse import urljoin
+import requests
+from parsel import Selector
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -23,37 +31,49 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 import subprocess
 from datetime import datetime
+from common_logging import setup_logging
 
-def setup_logging():
-    """Set up logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler("search_results.log"),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
-def search_products(keyword):
-    """
-    Search for products by keyword on Direct Derma website and return URLs of matching products
-    
-    Args:
-        keyword (str): The keyword to search for
-        
-    Returns:
-        list: List of URLs for products matching the keyword
-    """
-    logger = logging.getLogger(__name__)
-    logger.info(f"Searching for products with keyword: {keyword}")
-    
-    # URL for search
-    search_url = f"https://www.directdermasupplies.com/products?Search={keyword}"
-    
-    # Set up Chrome options
+# Returns the hrefs of the product links on the search page: the first product link of
+# each .product-item, else the grid item links, else any product link on the page
+_PRODUCT_LINKS_JS = """
+const tiers = [
+    () => Array.from(document.querySelectorAll('.product-item'),
+                     item => item.querySelector("a[href*='/products/']")).filter(Boolean),
+    () => Array.from(document.querySelectorAll(".grid__item a[href*='/products/']")),
+    () => Array.from(document.querySelectorAll("a[href*='/products/']")),
+];
+for (const tier of tiers) {
+    const links = tier();
+    if (links.length) {
+        return links.map(a => a.href);
+    }
+}
+return [];
+"""
+
+# Printed by run_scraper.py --jobs before the output file of each finished crawl
+_CRAWL_FINISHED_PREFIX = "CRAWL FINISHED: "
+
+# HTTP session shared by all searches so connections to the site are reused
+_http = requests.Session()
+_http.headers['User-Agent'] = "direct_derma_price_scraper (+http://www.yourdomain.com)"
+
+# Chrome drivers reused across searches, one per calling thread
+_drivers = {}
+_drivers_lock = threading.Lock()
+_driver_path = None
+
+def _chrome_options():
+    """Chrome options for the headless search browser"""
     chrome_options = Options()
     chrome_options.add_argument("--headless")
     chrome_options.add_argument("--no-sandbox")
@@ -61,53 +81,148 @@ def search_products(keyword):
     chrome_options.add_argument("--disable-gpu")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.add_argument("user-agent=direct_derma_price_scraper (+http://www.yourdomain.com)")
+    return chrome_options
+
+def _get_driver():
+    """
+    Return the calling thread's Chrome driver, starting it on first use
     
-    # Initialize the Chrome driver
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+    WebDriver sessions are not thread-safe, so batch_search's worker threads each get
+    their own; ChromeDriverManager().install() only runs once per process.
+    """
+    global _driver_path
+    thread = threading.current_thread()
+    with _drivers_lock:
+        driver = _drivers.get(thread)
+    if driver is None:
+        with _drivers_lock:
+            if _driver_path is None:
+                _driver_path = ChromeDriverManager().install()
+        driver = webdriver.Chrome(service=Service(_driver_path), options=_chrome_options())
+        with _drivers_lock:
+            _drivers[thread] = driver
+    return driver
+
+def _discard_driver(driver):
+    """Quit a single driver and forget it"""
+    with _drivers_lock:
+        for thread in [thread for thread, d in _drivers.items() if d is driver]:
+            del _drivers[thread]
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def close_driver(threads=None):
+    """
+    Quit the Chrome drivers started by search_products; call this once a run is done
+    
+    Args:
+        threads (iterable): Only quit the drivers of these threads, so runs in other
+            threads (such as other Streamlit sessions) keep theirs. Quits every driver
+            when omitted.
+    """
+    with _drivers_lock:
+        if threads is None:
+            threads = list(_drivers)
+        drivers = [_drivers.pop(thread) for thread in threads if thread in _drivers]
+    for driver in drivers:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+# Scripts that import search_products without calling close_driver() (such as
+# example_search.py) would otherwise leave Chrome running after they exit
+atexit.register(close_driver)
+
+def _search_static(search_url):
+    """
+    Fetch the search page over plain HTTP and return the product URLs in its HTML
+    
+    Uses the same selector order as _PRODUCT_LINKS_JS.
+    """
+    response = _http.get(search_url, timeout=15)
+    response.raise_for_status()
+    page = Selector(text=response.text)
+    
+    hrefs = [item.css("a[href*='/products/']::attr(href)").get() for item in page.css('.product-item')]
+    hrefs = [href for href in hrefs if href]
+    if not hrefs:
+        hrefs = page.css(".grid__item a[href*='/products/']::attr(href)").getall()
+    if not hrefs:
+        hrefs = page.css("a[href*='/products/']::attr(href)").getall()
+    
+    # Resolve relative links and skip duplicates while keeping page order
+    return list(dict.fromkeys(urljoin(response.url, href) for href in hrefs))
+
+def _search_rendered(keyword, search_url):
+    """Load the search page in this thread's Chrome driver and return the product URLs"""
+    logger = logging.getLogger(__name__)
+    
+    # Reuse this thread's Chrome driver across searches
+    driver = _get_driver()
     
     try:
         # Navigate to search results page
-        logger.info(f"Accessing search URL: {search_url}")
+        logger.info("Accessing search URL: %s", search_url)
         driver.get(search_url)
         
-        # Wait for search results to load
-        time.sleep(5)
+        # Wait until a product link has rendered instead of a fixed delay
+        try:
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located(
+                (By.CSS_SELECTOR, ".product-item, .grid__item a[href*='/products/'], a[href*='/products/']")))
+        except TimeoutException:
+            logger.warning("Timed out waiting for search results for: %s", keyword)
         
-        # Find product links
+        # Collect the product links in the browser with a single WebDriver round trip
         product_links = []
         try:
-            # Look for product elements
-            product_elements = driver.find_elements(By.CSS_SELECTOR, ".product-item")
-            
-            if not product_elements:
-                # Try alternative selector
-                product_elements = driver.find_elements(By.CSS_SELECTOR, ".grid__item a[href*='/products/']")
-            
-            if not product_elements:
-                # Try another alternative
-                product_elements = driver.find_elements(By.XPATH, "//a[contains(@href, '/products/')]")
-            
-            # Extract URLs
-            for element in product_elements:
-                try:
-                    if element.tag_name != 'a':
-                        element = element.find_element(By.CSS_SELECTOR, "a[href*='/products/']")
-                    
-                    url = element.get_attribute('href')
-                    if url and '/products/' in url and url not in product_links:
-                        product_links.append(url)
-                except Exception as e:
-                    logger.warning(f"Error extracting URL from element: {str(e)}")
+            urls = driver.execute_script(_PRODUCT_LINKS_JS)
             
-            logger.info(f"Found {len(product_links)} matching products")
+            # Skip duplicates while keeping page order
+            product_links = list(dict.fromkeys(url for url in urls if url and '/products/' in url))
+            logger.info("Found %d matching products", len(product_links))
             
         except Exception as e:
-            logger.error(f"Error finding product elements: {str(e)}")
+            logger.error("Error finding product elements: %s", e)
         
         return product_links
     
-    finally:
-        driver.quit()
+    except Exception:
+        # The browser may be in a bad state; start a fresh one for the next search
+        _discard_driver(driver)
+        raise
+
+def search_products(keyword):
+    """
+    Search for products by keyword on Direct Derma website and return URLs of matching products
+    
+    The search page is first fetched over plain HTTP; the headless browser is only
+    used when that finds no products.
+    
+    Args:
+        keyword (str): The keyword to search for
+        
+    Returns:
+        list: List of URLs for products matching the keyword
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Searching for products with keyword: %s", keyword)
+    
+    # URL for search
+    search_url = f"https://www.directdermasupplies.com/products?Search={keyword}"
+    
+    try:
+        product_links = _search_static(search_url)
+        if product_links:
+            logger.info("Found %d matching products", len(product_links))
+            return product_links
+        logger.info("No products in the static search page, rendering it with Chrome")
+    except Exception as e:
+        logger.warning("Plain HTTP search failed, rendering the page with Chrome: %s", e)
+    
+    return _search_rendered(keyword, search_url)
 
 def scrape_product_prices(urls, output_file):
     """
@@ -123,41 +238,91 @@ def scrape_product_prices(urls, output_file):
         logger.warning("No product URLs to scrape")
         return []
     
-    # Create a temporary file with the URLs
-    with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as temp:
-        for url in urls:
-            temp.write(f"{url}\n")
-        temp_filename = temp.name
+    # Pipe the URLs to the scraper instead of going through a temporary file. The crawl
+    # stays in a child process: Twisted's reactor cannot be restarted, and callers may
+    # run this from several threads at once.
+    cmd = [sys.executable, "run_scraper.py", "--input", "-", "--output", output_file]
+    logger.info("Running scraper with command: %s", ' '.join(cmd))
     
-    logger.info(f"Created temporary URL file with {len(urls)} URLs: {temp_filename}")
+    subprocess.run(cmd, input="\n".join(urls) + "\n", text=True, check=True)
     
-    try:
-        # Use the existing scraper to scrape the URLs with the same Python executable
-        cmd = [sys.executable, "run_scraper.py", "--input", temp_filename, "--output", output_file]
-        logger.info(f"Running scraper with command: {' '.join(cmd)}")
+    return read_results(output_file)
+
+def scrape_batch(jobs, on_finished=None):
+    """
+    Scrape prices for several sets of product URLs with a single scraper process
+    
+    All the crawls share one Twisted reactor in the child process (run_scraper.py --jobs),
+    so the scraper only starts up once per batch instead of once per keyword.
+    
+    Args:
+        jobs (dict): Maps each output file to the list of product URLs to scrape into it
+        on_finished (callable): Optional callback, called as on_finished(output_file, results)
+            as soon as the crawl for each output file ends
         
-        subprocess.run(cmd, check=True)
+    Returns:
+        dict: Maps each output file to its list of scraped product data dictionaries
+    """
+    logger = logging.getLogger(__name__)
+    
+    jobs = {output_file: urls for output_file, urls in jobs.items() if urls}
+    if not jobs:
+        logger.warning("No product URLs to scrape")
+        return {}
+    
+    cmd = [sys.executable, "run_scraper.py", "--jobs", "-"]
+    logger.info("Running scraper for %d outputs with command: %s", len(jobs), ' '.join(cmd))
+    
+    # The scraper reads all the jobs before it logs anything, so stdin can be written
+    # in full before stdout is read
+    results = {}
+    with subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) as proc:
+        proc.stdin.write(json.dumps(jobs))
+        proc.stdin.close()
         
-        # Read and return the results
-        if os.path.exists(output_file):
-            with open(output_file, 'r') as f:
-                try:
-                    data = json.load(f)
-                    logger.info(f"Successfully scraped {len(data)} products")
-                    return data
-                except json.JSONDecodeError:
-                    logger.error(f"Output file {output_file} does not contain valid JSON")
-                    return []
-        else:
-            logger.error(f"Output file {output_file} was not created")
-            return []
+        # Pass the scraper's output through, picking out the end of each crawl
+        for line in proc.stdout:
+            if line.startswith(_CRAWL_FINISHED_PREFIX):
+                output_file = line[len(_CRAWL_FINISHED_PREFIX):].rstrip('\n')
+                results[output_file] = read_results(output_file)
+                if on_finished:
+                    on_finished(output_file, results[output_file])
+            else:
+                sys.stdout.write(line)
     
-    finally:
-        # Clean up temporary file
-        try:
-            os.remove(temp_filename)
-        except Exception as e:
-            logger.warning(f"Failed to remove temporary file: {str(e)}")
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    
+    # Crawls the scraper did not report (it should report all of them)
+    for output_file in jobs.keys() - results.keys():
+        results[output_file] = read_results(output_file)
+        if on_finished:
+            on_finished(output_file, results[output_file])
+    return results
+
+def read_results(output_file):
+    """Read the products the scraper saved to output_file, or an empty list if there are none"""
+    logger = logging.getLogger(__name__)
+    
+    if os.path.exists(output_file):
+        with open(output_file, 'rb') as f:
+            try:
+                data = _loads(f.read())
+                logger.info("Successfully scraped %d products", len(data))
+                return data
+            except json.JSONDecodeError:
+                logger.error("Output file %s does not contain valid JSON", output_file)
+                return []
+    else:
+        logger.error("Output file %s was not created", output_file)
+        return []
+
+def _price_value(price):
+    """Numeric value of a scraped price for sorting; missing or unparseable prices count as 0"""
+    try:
+        return float(price or 0)
+    except (TypeError, ValueError):
+        return 0.0
 
 def display_results(results, keyword):
     """
@@ -171,7 +336,6 @@ def display_results(results, keyword):
     print(f"SEARCH RESULTS FOR: '{keyword}'")
     print("=" * 80)
     
-    # Add this specific format for batch_search.py to detect
     print(f"Found {len(results)} matching products")
     
     if not results:
@@ -184,7 +348,10 @@ def display_results(results, keyword):
     print(f"{'PRODUCT':<40} | {'PRICE':<15}")
     print("-" * 60)
     
-    for product in sorted(results, key=lambda x: float(x.get('price', '0') or '0')):
+    # Parse every price once up front and sort the indexes by it
+    prices = [_price_value(product.get('price')) for product in results]
+    for index in sorted(range(len(results)), key=prices.__getitem__):
+        product = results[index]
         name = product.get('product_name', 'Unknown')
         if len(name) > 37:
             name = name[:34] + '...'
@@ -211,7 +378,7 @@ def display_results(results, keyword):
     print("\n" + "=" * 80)
 
 def main():
-    setup_logging()
+    setup_logging("search_results.log")
     logger = logging.getLogger(__name__)
     
     parser = argparse.ArgumentParser(description='Search Direct Derma products by keyword')
@@ -239,12 +406,14 @@ def main():
         # Step 3: Display the results
         display_results(results, args.keyword)
         
-        logger.info(f"Search and scraping complete. Results saved to {args.output}")
+        logger.info("Search and scraping complete. Results saved to %s", args.output)
         print(f"\nFull results have been saved to {args.output}")
         
     except Exception as e:
-        logger.error(f"An error occurred: {str(e)}", exc_info=True)
+        logger.error("An error occurred: %s", e, exc_info=True)
         sys.exit(1)
+    finally:
+        close_driver()
 
 if __name__ == "__main__":
     main()